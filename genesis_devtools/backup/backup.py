@@ -160,14 +160,22 @@ def _terminate_backup_process(backup_process: mp.Process) -> None:
         backup_process.kill()
 
 
-def _resume_domains(domains: tp.List[str]) -> None:
-    paused_domain = libvirt.list_domains(state="state-paused")
+def _recover_domains(domains: tp.List[str]) -> None:
+    """Recover the domains after the backup process was terminated.
 
-    for domain in set(domains) & set(paused_domain):
+    Running domains are backed up from a snapshot, so they may be left on
+    the snapshot overlays. The domains without the guest agent are backed
+    up suspended, so they may be left paused.
+    """
+    paused_domains = set(libvirt.list_domains(state="state-paused"))
+
+    for domain in domains:
         try:
-            libvirt.resume_domain(domain)
+            if domain in paused_domains:
+                libvirt.resume_domain(domain)
+            libvirt.cleanup_snapshot(domain, libvirt.BACKUP_SNAPSHOT_NAME)
         except Exception:
-            click.secho(f"Resume of {domain} failed", fg="red")
+            click.secho(f"Recovery of {domain} failed", fg="red")
 
 
 def backup(
@@ -218,7 +226,7 @@ def backup(
             if os.path.exists(compressed_backup_path):
                 os.remove(compressed_backup_path)
 
-            _resume_domains(domains)
+            _recover_domains(domains)
             click.secho(
                 f"Backup process stopped due to low disk space ({free_gb} GB)",
                 fg="yellow",
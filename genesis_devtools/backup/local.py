@@ -29,14 +29,18 @@ from genesis_devtools import constants as c
 
 
 class LocalQcowBackuper(qcow.AbstractQcowBackuper):
+    # Disks are large, use a big buffer to reduce the number of syscalls
+    ENCRYPTION_CHUNK_SIZE_KB = 8 << 10
+
     def __init__(
         self,
         backup_dir: str,
         snapshot_name: str = "backup_snap",
         logger: logger_base.AbstractLogger | None = None,
         min_free_disk_space_gb: int = 50,
+        max_parallel: int = 4,
     ):
-        super().__init__(backup_dir, snapshot_name, logger)
+        super().__init__(backup_dir, snapshot_name, logger, max_parallel)
         self._min_free_disk_space_gb = min_free_disk_space_gb
 
     def _save_file_to_backup(
@@ -45,12 +49,20 @@ class LocalQcowBackuper(qcow.AbstractQcowBackuper):
         backup_path: str,
         encryption: base.EncryptionCreds | None = None,
     ) -> None:
-        shutil.copyfile(file_path, backup_path)
+        if not encryption:
+            shutil.copyfile(file_path, backup_path)
+            return
 
-        if encryption:
-            utils.encrypt_file(backup_path, encryption.key, encryption.iv)
-            os.remove(backup_path)
-            self._logger.info(f"Encryption of {backup_path} done")
+        # Encrypt the file on the fly instead of making a plain copy first,
+        # so the disk is read and the backup is written only once.
+        utils.encrypt_file(
+            file_path,
+            encryption.key,
+            encryption.iv,
+            chunk_size_kb=self.ENCRYPTION_CHUNK_SIZE_KB,
+            encrypted_path=backup_path + c.ENCRYPTED_EXTENSION,
+        )
+        self._logger.info(f"Encryption of {backup_path} done")
 
     def backup_domain_spec(
         self,
@@ -94,7 +106,7 @@ class LocalQcowBackuper(qcow.AbstractQcowBackuper):
         encryption: base.EncryptionCreds | None = None,
     ) -> None:
         """Backup domain snapshot."""
-        snapshot_path = self._snapshot_path(disks[0])
+        snapshot_path = libvirt.snapshot_path(disks[0], self._snapshot_name)
         snapshot_backup_path = os.path.join(
             domain_backup_path, os.path.basename(snapshot_path)
         )
@@ -138,9 +150,6 @@ class LocalQcowBackuper(qcow.AbstractQcowBackuper):
             self._logger.error("Backup process timed out!")
             backup_process.kill()
 
-    def _snapshot_path(self, disk_path: str) -> str:
-        return ".".join(disk_path.split(".")[:-1]) + f".{self._snapshot_name}"
-
     def _cleanup_after_failure(
         self, domains: tp.Collection[str], backup_path: str
     ) -> None:
@@ -150,36 +159,16 @@ class LocalQcowBackuper(qcow.AbstractQcowBackuper):
         if os.path.exists(compressed_backup_path):
             os.remove(compressed_backup_path)
 
-        # Merge snapshots and delete them
+        # The terminated backups may leave the domains on the snapshot
+        # overlays, merge them back and delete the snapshots.
         for domain in domains:
-            disks = libvirt.get_domain_disks(domain)
-
-            if len(disks) == 0:
-                self._logger.warn(f"No disks found for domain {domain}")
-                continue
-
-            snapshot_path = disks[0]
-
-            if os.path.exists(snapshot_path):
-                # Find the original disk
-                for disk_format in ("raw", "qcow2"):
-                    disk_path = ".".join(disks[0].split(".")[:-1]) + disk_format
-                    if os.path.exists(disk_path):
-                        break
-                else:
-                    self._logger.error(
-                        f"The original disk hasn't been found for domain {domain}"
-                    )
-                    continue
-
-                try:
-                    libvirt.merge_snapshot(domain, disk_path, snapshot_path)
-                    os.remove(snapshot_path)
-                    libvirt.delete_snapshot(domain, self._snapshot_name)
-                except Exception:
-                    self._logger.error(
-                        f"Failed to merge snapshot {snapshot_path} for domain {domain}"
-                    )
+            try:
+                libvirt.cleanup_snapshot(domain, self._snapshot_name)
+            except Exception as e:
+                self._logger.error(
+                    f"Failed to clean up snapshot {self._snapshot_name} "
+                    f"of domain {domain}: {e}"
+                )
 
     def backup(
         self,
@@ -231,8 +220,6 @@ class LocalQcowBackuper(qcow.AbstractQcowBackuper):
             if free_gb < self._min_free_disk_space_gb:
                 self._terminate_backup_process(backup_process)
                 self._cleanup_after_failure(domains, backup_path)
-
-                # _resume_domains(domains)
                 self._logger.error(
                     f"Backup process stopped due to low disk space ({free_gb} GB)",
                 )
@@ -18,8 +18,10 @@ from __future__ import annotations
 import os
 import re
 import abc
+import datetime
 import typing as tp
 import time
+from concurrent import futures
 
 from genesis_devtools.common.table import get_table
 
@@ -28,6 +30,8 @@ from genesis_devtools import logger as logger_base
 from genesis_devtools.infra.libvirt import libvirt
 from genesis_devtools import utils
 
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 
 class AbstractQcowBackuper(base.AbstractBackuper):
     COMPRESS_SUFFIX = ".tar.gz"
@@ -42,13 +46,29 @@ class AbstractQcowBackuper(base.AbstractBackuper):
         backup_dir: str,
         snapshot_name: str = "backup_snap",
         logger: logger_base.AbstractLogger | None = None,
+        max_parallel: int = 4,
     ):
         self._backup_dir = backup_dir
         self._logger = logger or logger_base.ClickLogger()
         self._snapshot_name = snapshot_name
+        self._max_parallel = max_parallel
+
+    def _remove_snapshot(self, domain: str, disks: tp.Collection[str]) -> None:
+        """Remove snapshot overlays and the snapshot metadata of the domain.
 
-    def _snapshot_path(self, disk_path: str) -> str:
-        return ".".join(disk_path.split(".")[:-1]) + f".{self._snapshot_name}"
+        The overlays are already merged into the base disks at this point,
+        so the whole group is cleaned up at once and a failure is only
+        reported, it doesn't override the backup status.
+        """
+        try:
+            for disk in disks:
+                os.remove(libvirt.snapshot_path(disk, self._snapshot_name))
+            libvirt.delete_snapshot(domain, self._snapshot_name)
+        except Exception as e:
+            self._logger.error(
+                f"Failed to remove snapshot {self._snapshot_name} "
+                f"of domain {domain}: {e}"
+            )
 
     def _backup_domain(
         self,
@@ -57,26 +77,24 @@ class AbstractQcowBackuper(base.AbstractBackuper):
         encryption: base.EncryptionCreds | None = None,
     ) -> tuple[str, str, str, str, str, str]:
         start, end = time.monotonic(), str(None)
-        ts, te = time.strftime("%Y-%m-%d %H:%M:%S"), str(None)
+        ts, te = f"{datetime.datetime.now():{TIME_FORMAT}}", str(None)
         status = "failed"
         duration = str(None)
 
-        domain_spec = libvirt.domain_xml(domain)
+        domain_spec, disks = libvirt.domain_xml_and_disks(domain)
         self.backup_domain_spec(
             domain_spec,
             domain_backup_path,
             encryption=encryption,
         )
 
-        disks = libvirt.get_domain_disks(domain)
-
         if len(disks) == 0:
             self._logger.error(f"No disks found for domain {domain}")
             return domain, ts, te, duration, "0", status
 
         # If the domain is active, create a snapshot to have an ability
         # to copy disks for running domain.
-        if libvirt.is_active_domain(domain):
+        if libvirt.is_active_domain_xml(domain_spec):
             libvirt.create_snapshot(domain, self._snapshot_name)
             has_snapshot = True
         else:
@@ -93,9 +111,10 @@ class AbstractQcowBackuper(base.AbstractBackuper):
             status = "success"
         finally:
             if has_snapshot:
-                for i, disk in enumerate(disks):
-                    device = "vd" + chr(ord("a") + i)
-                    snapshot_path = self._snapshot_path(disk)
+                # Read-only disks such as the config drive aren't snapshotted
+                snapshot_disks = libvirt.snapshot_disks_from_xml(domain_spec)
+                for device, disk in snapshot_disks:
+                    snapshot_path = libvirt.snapshot_path(disk, self._snapshot_name)
                     libvirt.merge_disk_snapshot(domain, device, disk, snapshot_path)
 
                 # Copy snapshot
@@ -105,22 +124,15 @@ class AbstractQcowBackuper(base.AbstractBackuper):
                     encryption=encryption,
                 )
 
-                for disk in disks:
-                    snapshot_path = self._snapshot_path(disk)
-                    os.remove(snapshot_path)
-                libvirt.delete_snapshot(domain, self._snapshot_name)
+                self._remove_snapshot(domain, [disk for _, disk in snapshot_disks])
             end = time.monotonic()
             duration = f"{end - start:.2f}"
             self._logger.info(
                 f"Backup of {domain} done with status {status} ({duration} s)"
             )
 
-        total_size = 0
-        for disk in disks:
-            total_size += os.path.getsize(disk)
-
-        size = utils.human_readable_size(total_size)
-        te = time.strftime("%Y-%m-%d %H:%M:%S")
+        size = utils.human_readable_size(sum(map(os.path.getsize, disks)))
+        te = f"{datetime.datetime.now():{TIME_FORMAT}}"
 
         return domain, ts, te, duration, size, status
 
@@ -167,20 +179,37 @@ class AbstractQcowBackuper(base.AbstractBackuper):
         table.add_column("size")
         table.add_column("status")
 
-        for domain in domains:
-            domain_backup_path = os.path.join(backup_path, domain)
-
-            try:
-                domain, ts, te, duration, size, status = self._backup_domain(
+        # Domains are independent, back them up concurrently. Rows are
+        # collected as backups complete and put into the table at once in
+        # the original domain order.
+        rows: tp.Dict[str, tp.Tuple[str, ...]] = {}
+        with futures.ThreadPoolExecutor(
+            max_workers=max(self._max_parallel, 1)
+        ) as executor:
+            backups = {
+                executor.submit(
+                    self._backup_domain,
                     domain,
-                    domain_backup_path,
+                    os.path.join(backup_path, domain),
                     encryption=encryption,
-                )
-            except Exception as e:
-                self._logger.error(f"Failed to backup domain {domain}: {e}")
-                continue
+                ): domain
+                for domain in domains
+            }
 
-            table.add_row(domain, ts, te, duration, size, status)
+            for future in futures.as_completed(backups):
+                try:
+                    domain, ts, te, duration, size, status = future.result()
+                except Exception as e:
+                    self._logger.error(
+                        f"Failed to backup domain {backups[future]}: {e}"
+                    )
+                    continue
+
+                rows[backups[future]] = (domain, ts, te, duration, size, status)
+
+        for domain in domains:
+            if domain in rows:
+                table.add_row(*rows[domain])
 
         self._logger.info(f"Summary: {backup_path}")
         self._logger.info(table)
@@ -37,14 +37,27 @@ class S3QcowBackuper(qcow.AbstractQcowBackuper):
         bucket_name: str,
         snapshot_name: str = "backup_snap",
         logger: logger_base.AbstractLogger | None = None,
+        max_parallel: int = 4,
     ):
-        self._access_key = access_key
-        self._secret_key = secret_key
+        # The backups of the host are stored under its prefix in the bucket
+        super().__init__(
+            host,
+            snapshot_name=snapshot_name,
+            logger=logger,
+            max_parallel=max_parallel,
+        )
         self._host = host
         self._bucket_name = bucket_name
-        self._endpoint_url = endpoint_url
-        self._logger = logger or logger_base.ClickLogger()
-        self._snapshot_name = snapshot_name
+
+        # Domains are backed up concurrently. The default boto3 session
+        # isn't thread-safe while clients are, so the client is created
+        # once and shared by all the threads.
+        self._s3_client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
 
     def _upload_stream(
         self,
@@ -53,17 +66,10 @@ class S3QcowBackuper(qcow.AbstractQcowBackuper):
         encryption: base.EncryptionCreds | None = None,
     ) -> None:
         """Upload a stream to S3."""
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=self._endpoint_url,
-            aws_access_key_id=self._access_key,
-            aws_secret_access_key=self._secret_key,
-        )
-
         if encryption:
             stream = utils.ReaderEncryptorIO(stream, encryption.key, encryption.iv)
             s3_path += self.ENCRYPTED_SUFFIX
-        s3_client.upload_fileobj(stream, self._bucket_name, s3_path)
+        self._s3_client.upload_fileobj(stream, self._bucket_name, s3_path)
 
     def _upload_file(
         self,
@@ -19,7 +19,6 @@ import os
 import shutil
 import typing as tp
 
-import git
 import bazooka
 import fnmatch
 
@@ -243,6 +242,9 @@ class GitDependency(base.AbstractDependency):
 
     def fetch(self, output_dir: str) -> None:
         """Fetch the dependency."""
+        # GitPython is heavy to import, load it only when it's really needed
+        import git
+
         repo_dir = os.path.basename(self._repo_url)
         if repo_dir.endswith(".git"):
             repo_dir = repo_dir[:-4]
@@ -16,15 +16,38 @@
 from __future__ import annotations
 
 import dataclasses
+import functools
 import json
 import os
 import typing as tp
+from concurrent import futures
 
 import requests
+from requests import adapters
+from urllib3.util import retry
 
 from genesis_devtools import exceptions
 from genesis_devtools import constants
 
+# orjson is considerably faster than the standard json module but
+# it's not a mandatory dependency, fall back to json if it's missing.
+try:
+    import orjson
+
+    def _json_loads(data: bytes) -> tp.Any:
+        return orjson.loads(data)
+
+    def _json_dumps(obj: tp.Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+except ImportError:
+
+    def _json_loads(data: bytes) -> tp.Any:
+        return json.loads(data)
+
+    def _json_dumps(obj: tp.Any) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
 
 class IAMClientError(exceptions.DevToolsException):
     pass
@@ -38,6 +61,11 @@ class TokenFileNotFoundError(exceptions.DevToolsException):
     pass
 
 
+@functools.lru_cache(maxsize=128)
+def _auth_file_path(project_dir: str) -> str:
+    return os.path.join(os.path.abspath(project_dir), ".genesis", "auth.json")
+
+
 @dataclasses.dataclass(frozen=True)
 class Token:
     url: str
@@ -49,7 +77,7 @@ class Token:
 
     @staticmethod
     def file_path(project_dir: str) -> str:
-        return os.path.join(os.path.abspath(project_dir), ".genesis", "auth.json")
+        return _auth_file_path(project_dir)
 
     @classmethod
     def exists(cls, project_dir: str) -> bool:
@@ -65,12 +93,12 @@ class Token:
     @classmethod
     def load(cls, project_dir: str) -> "Token":
         auth_file = cls.file_path(project_dir)
-        if not os.path.exists(auth_file):
+        try:
+            with open(auth_file, "rb") as f:
+                data = _json_loads(f.read())
+        except FileNotFoundError:
             raise TokenFileNotFoundError(f"Token file not found: {auth_file}")
 
-        with open(auth_file, "r") as f:
-            data = json.load(f)
-
         return cls.from_dict(data)
 
     def save(self, project_dir: str, force: bool = False) -> None:
@@ -81,12 +109,33 @@ class Token:
             raise TokenFileAlreadyExistsError(f"Token file already exists: {auth_file}")
 
         os.makedirs(auth_dir, exist_ok=True)
-        with open(auth_file, "w") as f:
-            json.dump(self.to_dict(), f, indent=2)
-        os.chmod(auth_file, 0o600)
+
+        # Write to a temporary file created with the final mode and
+        # replace the original one atomically, so a crash never leaves
+        # a torn auth file behind.
+        tmp_file = auth_file + ".tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            # The file object writes the whole data, unlike a single
+            # os.write call
+            with os.fdopen(fd, "wb") as f:
+                f.write(_json_dumps(self.to_dict()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, auth_file)
+        except Exception:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+            raise
 
 
 class IAMClient:
+    # Max number of kept alive connections per host, it's also the limit
+    # of concurrent requests for the bulk methods.
+    POOL_MAXSIZE = 8
+
     def __init__(
         self,
         iam_client_endpoint: str,
@@ -107,6 +156,53 @@ class IAMClient:
         self._refresh_ttl = refresh_ttl
         self._timeout_s = timeout_s
 
+        # Keep connections alive between calls instead of doing
+        # a new TCP/TLS handshake for every request.
+        self._session = requests.Session()
+        adapter = adapters.HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=retry.Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                # Return the last response to report the IAM error as is
+                raise_on_status=False,
+            ),
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # Parts of the token requests that don't change between calls
+        client_payload: dict[str, str] = {}
+        if client_id is not None:
+            client_payload["client_id"] = client_id
+        if client_secret is not None:
+            client_payload["client_secret"] = client_secret
+
+        self._base_password_payload: dict[str, str] = {
+            "grant_type": "password",
+            "scope": scope,
+            "ttl": str(ttl),
+            "refresh_ttl": str(refresh_ttl),
+            **client_payload,
+        }
+        self._base_refresh_payload: dict[str, str] = {
+            "grant_type": "refresh_token",
+            "refresh_ttl": str(refresh_ttl),
+            **client_payload,
+        }
+        self._form_headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    def __enter__(self) -> IAMClient:
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._session.close()
+
     def _request_json(
         self,
         method: str,
@@ -115,7 +211,7 @@ class IAMClient:
         **kwargs: tp.Any,
     ) -> dict[str, tp.Any]:
         try:
-            response = requests.request(
+            response = self._session.request(
                 method,
                 url,
                 timeout=self._timeout_s,
@@ -130,7 +226,7 @@ class IAMClient:
             )
 
         try:
-            return response.json()
+            return _json_loads(response.content)
         except ValueError:
             raise IAMClientError("IAM returned non-JSON response")
 
@@ -160,24 +256,16 @@ class IAMClient:
 
     def get_token_by_password(self, username: str, password: str) -> Token:
         data_payload: dict[str, str] = {
-            "grant_type": "password",
+            **self._base_password_payload,
             "username": username,
             "password": password,
-            "scope": self._scope,
-            "ttl": str(self._ttl),
-            "refresh_ttl": str(self._refresh_ttl),
         }
 
-        if self._client_id is not None:
-            data_payload["client_id"] = self._client_id
-        if self._client_secret is not None:
-            data_payload["client_secret"] = self._client_secret
-
         response_payload = self._request_json(
             "POST",
             self.token_endpoint,
             "IAM authentication failed",
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            headers=self._form_headers,
             data=data_payload,
         )
         access_token, refresh_token = self._extract_tokens(response_payload)
@@ -201,23 +289,17 @@ class IAMClient:
         effective_scope = token.scope if scope is None else scope
 
         data_payload: dict[str, str] = {
-            "grant_type": "refresh_token",
+            **self._base_refresh_payload,
             "refresh_token": token.refresh_token,
             "ttl": str(effective_ttl),
-            "refresh_ttl": str(self._refresh_ttl),
             "scope": effective_scope,
         }
 
-        if self._client_id is not None:
-            data_payload["client_id"] = self._client_id
-        if self._client_secret is not None:
-            data_payload["client_secret"] = self._client_secret
-
         response_payload = self._request_json(
             "POST",
             self.token_endpoint,
             "IAM refresh failed",
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            headers=self._form_headers,
             data=data_payload,
         )
         access_token, refresh_token = self._extract_tokens(response_payload)
@@ -238,3 +320,17 @@ class IAMClient:
             "IAM token validation failed",
             headers={"Authorization": f"Bearer {token.token}"},
         )
+
+    def me_many(self, tokens: tp.Collection[Token]) -> list[dict[str, tp.Any]]:
+        """Validate several tokens concurrently.
+
+        The requests share the connection pool of the client. Results
+        are returned in the order of the tokens.
+        """
+        if not tokens:
+            return []
+
+        with futures.ThreadPoolExecutor(
+            max_workers=min(len(tokens), self.POOL_MAXSIZE)
+        ) as executor:
+            return list(executor.map(self.me, tokens))
@@ -23,6 +23,7 @@ import time
 import typing as tp
 import ipaddress
 import pathlib
+import re
 import urllib.parse
 import yaml
 import fnmatch
@@ -890,29 +891,35 @@ def _start_validation_type(start: str | None) -> time.struct_time | None:
         raise click.UsageError("Invalid '--start' format. Use HH:MM:SS, e.g., 16:00:00")
 
 
+_GLOB_CHARS = frozenset("*?[")
+
+
 def _domains_for_backup(
     names: tp.List[str] | None = None,
     exclude_names: tp.List[str] | None = None,
     raise_on_domain_absence: bool = False,
 ) -> tp.List[str]:
     domains = set(libvirt.list_domains())
-    names = set(names or [])
-    exclude_names = set(exclude_names or [])
+    includes = frozenset(names or ())
+    excludes = frozenset(exclude_names or ())
 
     # Check if the specified domains exist
-    if raise_on_domain_absence and (names - domains):
-        diff = ", ".join(names - domains)
+    if raise_on_domain_absence and (includes - domains):
+        diff = ", ".join(includes - domains)
         raise click.UsageError(f"Domains {diff} not found")
 
-    if names:
-        domains &= names
+    if includes:
+        domains &= includes
+
+    # Plain names are dropped with a set difference, only the glob
+    # patterns need the regex
+    patterns = frozenset(p for p in excludes if _GLOB_CHARS.intersection(p))
+    domains -= excludes - patterns
 
-    if exclude_names:
-        domains = {
-            d
-            for d in domains
-            if not any(fnmatch.fnmatch(d, pattern) for pattern in exclude_names)
-        }
+    if patterns:
+        # Match all the patterns at once with a single compiled regex
+        excluded = re.compile("|".join(map(fnmatch.translate, patterns)))
+        domains = {d for d in domains if not excluded.match(d)}
 
     return list(domains)
 
@@ -281,9 +281,13 @@ class LibvirtInfraDriver(base.AbstractInfraDriver):
 
     def delete_stand(self, stand: models.Stand) -> None:
         """Delete the stand."""
-        for node in itertools.chain(stand.bootstraps, stand.baremetals):
-            if libvirt.has_domain(node.name):
-                libvirt.destroy_domain(node.name)
+        libvirt.destroy_domains(
+            [
+                node.name
+                for node in itertools.chain(stand.bootstraps, stand.baremetals)
+                if libvirt.has_domain(node.name)
+            ]
+        )
 
         for net in (stand.network.name, stand.boot_network.name):
             if libvirt.has_net(net):
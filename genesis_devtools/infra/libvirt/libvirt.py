@@ -15,22 +15,53 @@
 #    under the License.
 from __future__ import annotations
 
+import contextlib
+import fcntl
+import functools
 import json
 import os
-import re
-import tempfile
+import shlex
+import stat
 import itertools
 import subprocess
+import time
 import ipaddress
 import typing as tp
 import uuid as sys_uuid
+from concurrent import futures
 from xml.etree import ElementTree as ET
 
 from genesis_devtools.stand import models
 from genesis_devtools import constants as c
+from genesis_devtools.exceptions import RunException
 from genesis_devtools.infra.libvirt import constants as vc
 
 CONFIG_DRIVES_DIR = "/var/lib/genesis/config-drives"
+_DOMAIN_XML_END = "</domain>"
+
+
+def _shared_lock_dir() -> str:
+    """Return a directory for lock files that is the same for all users."""
+    # The per-user TMPDIR is not used on purpose, the lock must be seen
+    # by the processes of all users. /run/lock is writable by everyone on
+    # most distributions, but on some of them it's for root only.
+    try:
+        if os.stat("/run/lock").st_mode & stat.S_IWOTH:
+            return "/run/lock"
+    except OSError:
+        pass
+
+    return "/tmp"
+
+
+# Libvirt rejects volume operations while the pool has asynchronous jobs
+# running, e.g. `vol-delete` during `vol-upload`, so all storage
+# modifications are serialized, across processes as well.
+STORAGE_LOCK_PATH = os.path.join(_shared_lock_dir(), "genesis-devtools-storage.lock")
+LIST_CACHE_TTL = 0.5
+BACKUP_SNAPSHOT_NAME = "backup_snap"
+
+_list_cache: tp.Dict[str, tp.Tuple[float, tp.List[str]]] = {}
 
 domain_template = """
 <domain type="kvm">
@@ -181,98 +212,196 @@ cdrom_template = """
 """
 
 
+def _virsh_output(*args: str) -> str:
+    return subprocess.check_output(["sudo", "virsh", *args], text=True)
+
+
+def _virsh_lines(*args: str) -> tp.List[str]:
+    """Run virsh and return the non-empty lines of its output."""
+    return [line for line in _virsh_output(*args).splitlines() if line]
+
+
+def _cached_list(key: str, fetch: tp.Callable[[], tp.List[str]]) -> tp.List[str]:
+    """Return the cached listing or fetch it if it's expired.
+
+    Checks such as `has_domain` and `has_net` are called many times in a
+    row while a stand is created or destroyed, the listings are cached
+    for a short time and dropped on every domain or network change.
+    """
+    now = time.monotonic()
+    cached = _list_cache.get(key)
+    if cached is None or now - cached[0] >= LIST_CACHE_TTL:
+        cached = (now, fetch())
+        _list_cache[key] = cached
+
+    return list(cached[1])
+
+
+def _invalidates_lists(func: tp.Callable) -> tp.Callable:
+    @functools.wraps(func)
+    def wrapper(*args: tp.Any, **kwargs: tp.Any) -> tp.Any:
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _list_cache.clear()
+
+    return wrapper
+
+
+def _list_domain_names(state: c.DomainState = "all") -> tp.List[str]:
+    def _fetch() -> tp.List[str]:
+        return _virsh_lines("list", f"--{state}", "--name")
+
+    return _cached_list(f"domains-{state}", _fetch)
+
+
+def _c_locale_env() -> tp.Dict[str, str]:
+    """Environment to run virsh with untranslated messages.
+
+    sudo keeps the LC_* variables of the caller by default.
+    """
+    return {**os.environ, "LC_ALL": "C"}
+
+
+def _virsh_batch(*commands: tp.Sequence[str], input: str | None = None) -> str:
+    """Run several independent virsh commands using a single invocation.
+
+    Virsh goes on with the next command if the previous one fails and
+    its exit code reflects only the last command, so failures are
+    detected by the errors reported to stderr. Commands depending on
+    the result of a previous one must not be batched. Virsh translates
+    the messages, so it runs in the C locale to keep the "error:" prefix
+    stable. The `input` is passed to virsh stdin, commands may read it
+    from `/dev/stdin`.
+    """
+    script = "; ".join(shlex.join(command) for command in commands)
+    cmd = ["sudo", "virsh", script]
+    result = subprocess.run(
+        cmd, input=input, capture_output=True, text=True, env=_c_locale_env()
+    )
+    if result.returncode != 0 or "error:" in result.stderr:
+        raise RunException(
+            f"Command failed: {' '.join(cmd)}\nError: {result.stderr.strip()}"
+        )
+
+    return result.stdout
+
+
+def _dump_domains_xml(names: tp.Collection[str]) -> tp.Dict[str, str]:
+    """Dump XML of several domains using a single virsh invocation.
+
+    The result is a mapping of the domain name to its XML.
+    """
+    if not names:
+        return {}
+
+    out = _virsh_batch(*(["dumpxml", name] for name in names))
+
+    domains = {}
+    for xml_str in out.split(_DOMAIN_XML_END)[:-1]:
+        xml_str = xml_str.lstrip() + _DOMAIN_XML_END
+        name = ET.fromstring(xml_str).findtext("name")
+        if name is None:
+            raise ValueError("Unable to find 'name' in domain xml")
+        domains[name] = xml_str
+
+    return domains
+
+
 def list_domains(
     meta_tag: str | None = None, state: c.DomainState = "all"
 ) -> tp.List[str]:
     """List all domains."""
-    out = subprocess.check_output(["sudo", "virsh", "list", f"--{state}", "--name"])
-    out = out.decode().strip()
-    names = [o for o in out.split("\n") if o]
+    names = _list_domain_names(state)
 
     if not meta_tag:
         return names
 
-    # FIXME(akremenetsky): Need more optimization here
     # Find all domains with the corresponding meta tag
-    domains = []
-    for name in names:
-        out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-        out = out.decode().strip()
-        if meta_tag in out:
-            domains.append(name)
-
-    return domains
+    return [
+        name
+        for name, xml_str in _dump_domains_xml(names).items()
+        if meta_tag in xml_str
+    ]
 
 
 def list_xml_domains(
     meta_tag: str | None = None, state: c.DomainState = "all"
 ) -> tp.List[str]:
     """List all domains."""
-    out = subprocess.check_output(["sudo", "virsh", "list", f"--{state}", "--name"])
-    out = out.decode().strip()
-    names = [o for o in out.split("\n") if o]
+    names = _list_domain_names(state)
 
-    # FIXME(akremenetsky): Need more optimization here
     # Find all domains with the corresponding meta tag
-    domains = []
-    for name in names:
-        out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-        out = out.decode().strip()
-        if meta_tag and meta_tag in out:
-            domains.append(out)
-        elif not meta_tag:
-            domains.append(out)
-
-    return domains
+    return [
+        xml_str
+        for xml_str in _dump_domains_xml(names).values()
+        if not meta_tag or meta_tag in xml_str
+    ]
 
 
 def is_active_domain(name: str) -> bool:
-    return name not in list_domains(state="inactive")
+    # Query the domain only instead of listing all the inactive domains.
+    # Inactive domains have no ID, virsh prints "-" for them. Unlike the
+    # domain state the output isn't translated.
+    return _virsh_output("domid", name).strip() != "-"
 
 
 def list_nets():
     """List all networks."""
-    out = subprocess.check_output(["sudo", "virsh", "net-list", "--all", "--name"])
-    out = out.decode().strip()
-    return out.split("\n")
+
+    def _fetch() -> tp.List[str]:
+        return _virsh_lines("net-list", "--all", "--name")
+
+    return _cached_list("nets", _fetch)
 
 
 def list_pool():
     """List all pools."""
-    out = subprocess.check_output(["sudo", "virsh", "pool-list", "--all", "--name"])
-    out = out.decode().strip()
-    return out.split("\n")
+    return _virsh_lines("pool-list", "--all", "--name")
 
 
+@contextlib.contextmanager
+def _storage_lock() -> tp.Iterator[None]:
+    try:
+        fd = os.open(STORAGE_LOCK_PATH, os.O_RDONLY | os.O_CREAT, 0o644)
+    except PermissionError:
+        # With `fs.protected_regular` O_CREAT is denied in sticky
+        # directories if the file belongs to another user, even though
+        # the file exists and may be opened for reading.
+        fd = os.open(STORAGE_LOCK_PATH, os.O_RDONLY)
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+@_invalidates_lists
 def define_network(name: str, net_xml: str):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        network_path = os.path.join(temp_dir, f"{name}.xml")
-        with open(network_path, "w") as f:
-            f.write(net_xml)
+    # The batch doesn't stop on a failure, so define the network on its
+    # own to not start another network with the same name.
+    _virsh_batch(["net-define", "/dev/stdin"], input=net_xml)
+    _virsh_batch(["net-start", name], ["net-autostart", name])
 
-        subprocess.check_call(
-            ["sudo", "virsh", "net-define", network_path],
-            stdout=subprocess.DEVNULL,
-        )
-        subprocess.check_call(
-            ["sudo", "virsh", "net-start", name],
-            stdout=subprocess.DEVNULL,
-        )
-        subprocess.check_call(
-            ["sudo", "virsh", "net-autostart", name],
-            stdout=subprocess.DEVNULL,
-        )
+
+@functools.lru_cache(maxsize=32)
+def _nat_net_params(cidr: ipaddress.IPv4Network) -> tp.Tuple[str, str, str, str]:
+    # The result is cached, so it's an immutable tuple of
+    # (ip, netmask, range_start, range_end)
+    return (str(cidr[1]), str(cidr.netmask), str(cidr[10]), str(cidr[100]))
 
 
 def create_nat_network(
     name: str, cidr: ipaddress.IPv4Network, dhcp_enabled: bool = True
 ):
+    ip, netmask, range_start, range_end = _nat_net_params(cidr)
     net_params = {
         "name": name,
-        "netmask": str(cidr.netmask),
-        "ip": str(cidr[1]),
-        "range_start": str(cidr[10]),
-        "range_end": str(cidr[100]),
+        "ip": ip,
+        "netmask": netmask,
+        "range_start": range_start,
+        "range_end": range_end,
     }
 
     if dhcp_enabled:
@@ -289,6 +418,13 @@ def create_isolated_network(name: str):
     define_network(name, network)
 
 
+def _remove_disks(disk_paths: tp.Iterable[str]) -> None:
+    with _storage_lock():
+        for disk_path in disk_paths:
+            subprocess.check_call(["sudo", "rm", "-f", disk_path])
+
+
+@_invalidates_lists
 def create_domain(
     uuid: sys_uuid.UUID,
     name: str,
@@ -304,8 +440,8 @@ def create_domain(
     config_drive: str | None = None,
     start: bool = True,
 ):
-    disks_xml = ""
-    ifaces_xml = ""
+    disks_xml = []
+    ifaces_xml = []
     disk_paths = []
     index = 0
 
@@ -328,22 +464,29 @@ def create_domain(
         create_volume(
             pool, image_name, disks[0].size, source_path=image, fmt=img_format
         )
-        disks_xml = disk_template.format(
-            device="vda",
-            image=tgt_image_path,
+        disks_xml.append(
+            disk_template.format(
+                device="vda",
+                image=tgt_image_path,
+            )
         )
         index += 1
 
+    volumes = []
     for i, disk in enumerate(disks[index:], index):
         disk_name = f"{disk.uuid(uuid)}{img_suffix}"
         disk_path = os.path.join(pool_path, disk_name)
         disk_paths.append(disk_path)
-        create_volume(pool, disk_name, disk.size, fmt=img_format)
-        disks_xml += disk_template.format(
-            device=f"vd{chr(ord('a') + i)}",
-            image=disk_path,
+        volumes.append((disk_name, disk.size))
+        disks_xml.append(
+            disk_template.format(
+                device=f"vd{chr(ord('a') + i)}",
+                image=disk_path,
+            )
         )
 
+    create_volumes(pool, volumes, fmt=img_format)
+
     for network, port in itertools.zip_longest(networks, ports):
         if not network:
             continue
@@ -353,9 +496,9 @@ def create_domain(
             network_iface = network_iface_template.format(network=network.name, mac=mac)
         else:
             network_iface = bridge_iface_template.format(network=network.name, mac=mac)
-        ifaces_xml += network_iface
+        ifaces_xml.append(network_iface)
 
-    meta_tags_xml = "\n\t\t".join(tag for tag in meta_tags)
+    meta_tags_xml = "\n\t\t".join(meta_tags)
 
     if boot == "hd":
         boot = f'<boot dev="{boot}"/>'
@@ -370,11 +513,13 @@ def create_domain(
         )
         config_drive_path = os.path.join(CONFIG_DRIVES_DIR, f"{name}-config-drive.iso")
         subprocess.check_call(
-            ["sudo", "cp", config_drive, config_drive_path],
+            ["sudo", "cp", "--reflink=auto", config_drive, config_drive_path],
             stdout=subprocess.DEVNULL,
         )
-        disks_xml += cdrom_template.format(
-            config_drive_path=config_drive_path,
+        disks_xml.append(
+            cdrom_template.format(
+                config_drive_path=config_drive_path,
+            )
         )
 
     memory <<= 10
@@ -382,74 +527,97 @@ def create_domain(
         name=name,
         cores=cores,
         memory=memory,
-        net_ifaces=ifaces_xml,
-        disks=disks_xml,
+        net_ifaces="".join(ifaces_xml),
+        disks="".join(disks_xml),
         uuid=uuid,
         meta_tags=meta_tags_xml,
         boot=boot,
     )
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        domain_path = os.path.join(temp_dir, f"{name}.xml")
-        with open(domain_path, "w") as f:
-            f.write(domain)
+    try:
+        _virsh_batch(["define", "/dev/stdin"], input=domain)
+    except Exception:
+        # Unable to define domain, delete disks. A domain with the same
+        # name may already exist, so don't touch it.
+        _remove_disks(disk_paths)
+        return
 
-        try:
-            subprocess.check_call(
-                ["sudo", "virsh", "define", domain_path],
-                stdout=subprocess.DEVNULL,
-            )
-            subprocess.check_call(
-                ["sudo", "virsh", "autostart", name],
-                stdout=subprocess.DEVNULL,
-            )
-            if start:
-                subprocess.check_call(
-                    ["sudo", "virsh", "start", name],
-                    stdout=subprocess.DEVNULL,
-                )
-        except Exception:
-            # Unable to create domain, delete disks
-            for disk_path in disk_paths:
-                subprocess.check_call(["sudo", "rm", "-f", disk_path])
+    commands = [["autostart", name]]
+    if start:
+        commands.append(["start", name])
+
+    try:
+        _virsh_batch(*commands)
+    except Exception:
+        # Unable to start domain, undefine it and delete disks
+        subprocess.run(
+            ["sudo", "virsh", "undefine", "--nvram", name],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        _remove_disks(disk_paths)
 
 
 def get_domain_ip(name: str) -> tp.Optional[str]:
-    out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-    out = out.decode().strip()
+    """Return the first IPv4 address leased to the domain, if any."""
+    # The domain may be stopped or may not have got a lease yet,
+    # there is no IP address in this case.
+    result = subprocess.run(
+        ["sudo", "virsh", "domifaddr", name, "--source", "lease"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
 
-    mac_addresses = re.findall(r"<mac address='(.*?)'", out)
-    networs = re.findall(r"<source network='(.*?)'", out)
-    # Instance without network interfaces ?
-    if not mac_addresses:
-        return
+    # Name  MAC address  Protocol  Address
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) == 4 and fields[2] == "ipv4":
+            return fields[3].partition("/")[0]
 
-    # Actually it's not right solution but for simplicity keep it.
-    for mac, net in zip(mac_addresses, networs):
-        out = subprocess.check_output(
-            ["sudo", "virsh", "net-dhcp-leases", net],
-        )
-        out = out.decode().strip()
-        for line in out.split("\n"):
-            if mac in line:
-                return re.findall(r"\d+\.\d+\.\d+\.\d+", line)[0]
+    return None
 
 
-def get_domain_disk(name: str) -> str | None:
-    out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-    out = out.decode().strip()
+def _disks_from_xml(xml_str: str) -> tp.List[str]:
+    xml = ET.fromstring(xml_str)
+    return [
+        path
+        for source in xml.iterfind("./devices/disk/source")
+        if (path := source.get("file"))
+    ]
 
+
+def _writable_disks(xml: ET.Element) -> tp.Iterator[tp.Tuple[str, str, ET.Element]]:
+    """Yield the device, the path and the element of writable file disks."""
+    for disk in xml.iterfind("./devices/disk[@device='disk']"):
+        target, source = disk.find("target"), disk.find("source")
+        if disk.find("readonly") is not None or target is None or source is None:
+            continue
+
+        if (device := target.get("dev")) and (path := source.get("file")):
+            yield device, path, disk
+
+
+def snapshot_disks_from_xml(xml_str: str) -> tp.List[tp.Tuple[str, str]]:
+    """Return (device, path) pairs of the disks covered by disk snapshots.
+
+    Libvirt doesn't snapshot read-only disks such as the config drive
+    CD-ROM, so only writable file disks are returned.
+    """
+    return [
+        (device, path) for device, path, _ in _writable_disks(ET.fromstring(xml_str))
+    ]
+
+
+def get_domain_disk(name: str) -> str | None:
     # The simplest implementation, take first disk
-    if disks := re.findall(r"<source file='(.*?)'", out):
+    if disks := get_domain_disks(name):
         return disks[0]
 
 
 def get_domain_disks(name: str) -> tp.List[str]:
-    out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-    out = out.decode().strip()
-
-    # The simplest implementation, take first disk
-    return re.findall(r"<source file='(.*?)'", out)
+    return _disks_from_xml(domain_xml(name))
 
 
 def has_domain(name: str) -> bool:
@@ -460,11 +628,12 @@ def has_net(name: str) -> bool:
     return name in list_nets()
 
 
+@_invalidates_lists
 def destroy_domain(name: str) -> None:
     """Delete domain."""
-    domain_disks = get_domain_disks(name)
+    xml_str, domain_disks = domain_xml_and_disks(name)
 
-    if is_active_domain(name):
+    if is_active_domain_xml(xml_str):
         try:
             subprocess.check_call(
                 ["sudo", "virsh", "destroy", name],
@@ -474,24 +643,36 @@ def destroy_domain(name: str) -> None:
             # Nothing to do, the domain is already destroyed
             pass
 
-    try:
-        subprocess.run(
-            ["sudo", "virsh", "undefine", "--nvram", "--remove-all-storage", name],
-            stdout=subprocess.DEVNULL,
-            check=True,
-        )
-    except subprocess.CalledProcessError:
-        # Nothing to do, the domain is already undefined
-        pass
+    with _storage_lock():
+        try:
+            subprocess.run(
+                ["sudo", "virsh", "undefine", "--nvram", "--remove-all-storage", name],
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+        except subprocess.CalledProcessError:
+            # Nothing to do, the domain is already undefined
+            pass
 
-    # Remove leftover disks not managed by a pool (e.g. config drive ISOs)
-    for disk_path in domain_disks:
-        subprocess.check_call(
-            ["sudo", "rm", "-f", disk_path],
-            stdout=subprocess.DEVNULL,
-        )
+        # Remove leftover disks not managed by a pool (e.g. config drive ISOs)
+        if domain_disks:
+            subprocess.check_call(
+                ["sudo", "rm", "-f", *domain_disks],
+                stdout=subprocess.DEVNULL,
+            )
 
 
+def destroy_domains(names: tp.Collection[str], max_workers: int = 8) -> None:
+    """Delete domains concurrently."""
+    if not names:
+        return
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results to propagate errors
+        list(executor.map(destroy_domain, names))
+
+
+@_invalidates_lists
 def destroy_net(name: str) -> None:
     """Delete network."""
     try:
@@ -514,50 +695,141 @@ def destroy_net(name: str) -> None:
 
 
 def domain_xml(name: str) -> str:
-    out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-    return out.decode().strip()
+    return _virsh_output("dumpxml", name).strip()
 
 
-def backup_domain(name: str, backup_path: str) -> None:
-    disks = get_domain_disks(name)
+def domain_xml_and_disks(name: str) -> tp.Tuple[str, tp.List[str]]:
+    """Return the domain XML and its disks using a single dump."""
+    xml_str = domain_xml(name)
+    return xml_str, _disks_from_xml(xml_str)
 
-    # Save domain xml
-    out = subprocess.check_output(["sudo", "virsh", "dumpxml", name])
-    out = out.decode().strip()
 
+def is_active_domain_xml(xml_str: str) -> bool:
+    """Check if the domain is active by its dumped XML.
+
+    Libvirt assigns the `id` attribute only to running or paused
+    domains, so it's the same check as `is_active_domain` without
+    an extra virsh call.
+    """
+    return ET.fromstring(xml_str).get("id") is not None
+
+
+def _copy_disks(disks: tp.Collection[str], dst_dir: str) -> None:
+    """Copy the disks to the directory concurrently."""
+
+    def _copy(disk: str) -> None:
+        dst_path = os.path.join(dst_dir, os.path.basename(disk))
+        subprocess.check_call(["sudo", "cp", "--reflink=auto", disk, dst_path])
+
+    with futures.ThreadPoolExecutor(max_workers=max(len(disks), 1)) as executor:
+        # Consume the results to propagate errors
+        list(executor.map(_copy, disks))
+
+
+def snapshot_path(disk_path: str, snap_name: str) -> str:
+    """Path of the external snapshot overlay libvirt creates for the disk."""
+    return f"{os.path.splitext(disk_path)[0]}.{snap_name}"
+
+
+def _copy_suspended_domain_disks(
+    name: str, disks: tp.Collection[str], dst_dir: str
+) -> None:
+    subprocess.check_call(
+        ["sudo", "virsh", "suspend", name],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        _copy_disks(disks, dst_dir)
+    finally:
+        resume_domain(name)
+
+
+def _create_backup_snapshot(name: str, snap_name: str) -> bool:
+    """Create the backup snapshot of the domain.
+
+    Return False if the domain has no guest agent to quiesce the disks,
+    other errors are raised.
+    """
+    try:
+        create_snapshot(name, snap_name)
+    except RunException as e:
+        if "guest agent" not in str(e).lower():
+            raise
+        return False
+
+    return True
+
+
+def backup_domain(
+    name: str, backup_path: str, snap_name: str = BACKUP_SNAPSHOT_NAME
+) -> None:
+    xml_str, disks = domain_xml_and_disks(name)
+    active = is_active_domain_xml(xml_str)
+
+    # Active domain. The guest writes go to the snapshot overlays while
+    # the disks are copied, so the domain doesn't need to be suspended.
+    snapshot_created = False
+    if active:
+        try:
+            snapshot_created = _create_backup_snapshot(name, snap_name)
+        except RunException:
+            # The snapshot may be left by an interrupted backup,
+            # clean it up and try again
+            cleanup_snapshot(name, snap_name)
+            xml_str, disks = domain_xml_and_disks(name)
+            snapshot_created = _create_backup_snapshot(name, snap_name)
+
+    # Save domain xml
     with open(os.path.join(backup_path, "domain.xml"), "w") as f:
-        f.write(out)
+        f.write(xml_str)
 
     # Not active domain
-    if not is_active_domain(name):
-        for disk in disks:
-            disk_name = os.path.basename(disk)
-            backup_disk_path = os.path.join(backup_path, disk_name)
-            subprocess.check_call(["sudo", "cp", disk, backup_disk_path])
+    if not active:
+        _copy_disks(disks, backup_path)
+        return
+
+    # No guest agent in the domain, copy the disks of the suspended domain
+    if not snapshot_created:
+        _copy_suspended_domain_disks(name, disks, backup_path)
         return
 
-    # Active domain
+    snapshot_disks = snapshot_disks_from_xml(xml_str)
     try:
+        _copy_disks(disks, backup_path)
+    finally:
+        merge_disk_snapshots(name, snapshot_disks, snap_name)
+        delete_snapshot(name, snap_name)
         subprocess.check_call(
-            ["sudo", "virsh", "suspend", name],
+            [
+                "sudo",
+                "rm",
+                "-f",
+                *(snapshot_path(disk, snap_name) for _, disk in snapshot_disks),
+            ],
             stdout=subprocess.DEVNULL,
         )
 
-        for disk in disks:
-            disk_name = os.path.basename(disk)
-            backup_disk_path = os.path.join(backup_path, disk_name)
-            subprocess.check_call(["sudo", "cp", disk, backup_disk_path])
 
-    finally:
-        subprocess.check_call(
-            ["sudo", "virsh", "resume", name],
+def _run_quiet(cmd: tp.List[str]) -> None:
+    """Run the command discarding its output, stderr is reported on failure."""
+    try:
+        subprocess.run(
+            cmd,
+            check=True,
             stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            # The errors are matched by their text
+            env=_c_locale_env(),
+        )
+    except subprocess.CalledProcessError as e:
+        raise RunException(
+            f"Command failed: {' '.join(cmd)}\nError: {e.stderr.decode().strip()}"
         )
 
 
 def create_snapshot(domain: str, snap_name: str = "snapshot") -> None:
     # Create a snapshot
-    subprocess.check_call(
+    _run_quiet(
         [
             "sudo",
             "virsh",
@@ -567,13 +839,12 @@ def create_snapshot(domain: str, snap_name: str = "snapshot") -> None:
             "--disk-only",
             "--quiesce",
             "--atomic",
-        ],
-        stdout=subprocess.DEVNULL,
+        ]
     )
 
 
 def delete_snapshot(domain: str, snap_name: str = "snapshot") -> None:
-    subprocess.check_call(
+    _run_quiet(
         [
             "sudo",
             "virsh",
@@ -581,15 +852,14 @@ def delete_snapshot(domain: str, snap_name: str = "snapshot") -> None:
             domain,
             snap_name,
             "--metadata",
-        ],
-        stdout=subprocess.DEVNULL,
+        ]
     )
 
 
 def merge_disk_snapshot(
     domain: str, device: str, disk_path: str, snapshot_path: str
 ) -> None:
-    subprocess.check_call(
+    _run_quiet(
         [
             "sudo",
             "virsh",
@@ -603,11 +873,63 @@ def merge_disk_snapshot(
             disk_path,
             "--wait",
             "--pivot",
-        ],
-        stdout=subprocess.DEVNULL,
+        ]
     )
 
 
+def merge_disk_snapshots(
+    domain: str,
+    disks: tp.Collection[tp.Tuple[str, str]],
+    snap_name: str = "snapshot",
+) -> None:
+    """Merge the snapshot overlays of all the domain disks concurrently.
+
+    The disks are (device, path) pairs as `snapshot_disks_from_xml`
+    returns them.
+    """
+
+    def _merge(disk: tp.Tuple[str, str]) -> None:
+        device, path = disk
+        merge_disk_snapshot(domain, device, path, snapshot_path(path, snap_name))
+
+    with futures.ThreadPoolExecutor(max_workers=max(len(disks), 1)) as executor:
+        # Consume the results to propagate errors
+        list(executor.map(_merge, disks))
+
+
+def cleanup_snapshot(name: str, snap_name: str = "snapshot") -> None:
+    """Merge and remove the disk snapshot left by an interrupted backup.
+
+    The backup may be interrupted at any step, so the domain may still
+    run on the snapshot overlays, be already switched back to its disks
+    or have no snapshot at all. The steps already done are skipped.
+    """
+    pending = []
+    disks = []
+    for device, path, disk in _writable_disks(ET.fromstring(domain_xml(name))):
+        backing = disk.find("./backingStore/source")
+        base = backing.get("file") if backing is not None else None
+
+        # The domain still writes to the overlay
+        if base and path == snapshot_path(base, snap_name):
+            pending.append((device, base))
+            path = base
+
+        disks.append(path)
+
+    if pending:
+        merge_disk_snapshots(name, pending, snap_name)
+
+    if snap_name in _virsh_lines("snapshot-list", name, "--name"):
+        delete_snapshot(name, snap_name)
+
+    if disks:
+        subprocess.check_call(
+            ["sudo", "rm", "-f", *(snapshot_path(disk, snap_name) for disk in disks)],
+            stdout=subprocess.DEVNULL,
+        )
+
+
 def resume_domain(name: str) -> None:
     subprocess.check_call(
         ["sudo", "virsh", "resume", name],
@@ -616,9 +938,7 @@ def resume_domain(name: str) -> None:
 
 
 def get_pool_info(pool: str) -> dict[str, int | str]:
-    out = subprocess.check_output(["sudo", "virsh", "pool-dumpxml", pool])
-    xml_str = out.decode().strip()
-    xml = ET.fromstring(xml_str)
+    xml = ET.fromstring(_virsh_output("pool-dumpxml", pool))
 
     def _find_int(tag: str) -> int:
         elem = xml.find(tag)
@@ -640,26 +960,17 @@ def get_pool_info(pool: str) -> dict[str, int | str]:
 
 
 def _get_vol_path(pool: str, name: str) -> str:
-    out = subprocess.check_output(["sudo", "virsh", "vol-path", "--pool", pool, name])
-    return out.decode().strip()
+    return _virsh_output("vol-path", "--pool", pool, name).strip()
 
 
 def _get_image_format(path: str) -> str:
     out = subprocess.check_output(["sudo", "qemu-img", "info", "--output=json", path])
-    info = json.loads(out.decode().strip())
+    info = json.loads(out)
     return info["format"]
 
 
-def create_volume(
-    pool: str,
-    name: str,
-    size_gb: int,
-    fmt: str = "qcow2",
-    source_path: str | None = None,
-) -> None:
-    args = [
-        "sudo",
-        "virsh",
+def _vol_create_as_args(pool: str, name: str, size_gb: int, fmt: str) -> tp.List[str]:
+    return [
         "vol-create-as",
         pool,
         name,
@@ -669,33 +980,65 @@ def create_volume(
         "--format",
         fmt,
     ]
-    subprocess.check_call(args, stdout=subprocess.DEVNULL)
-
-    if source_path is not None:
-        if fmt == "raw":
-            # vol-upload copies raw bytes without format conversion,
-            # so we must use qemu-img convert to handle any source format.
-            vol_path = _get_vol_path(pool, name)
-            src_fmt = _get_image_format(source_path)
-            subprocess.check_call(
-                [
-                    "sudo",
-                    "qemu-img",
-                    "convert",
-                    "-f",
-                    src_fmt,
-                    "-O",
-                    "raw",
-                    source_path,
-                    vol_path,
-                ],
-                stdout=subprocess.DEVNULL,
-            )
-        else:
-            subprocess.check_call(
-                ["sudo", "virsh", "vol-upload", "--pool", pool, name, source_path],
-                stdout=subprocess.DEVNULL,
+
+
+def create_volumes(
+    pool: str,
+    volumes: tp.Collection[tp.Tuple[str, int]],
+    fmt: str = "qcow2",
+) -> None:
+    """Create empty volumes using a single virsh invocation.
+
+    The volumes are (name, size_gb) pairs.
+    """
+    if not volumes:
+        return
+
+    with _storage_lock():
+        _virsh_batch(
+            *(
+                _vol_create_as_args(pool, name, size_gb, fmt)
+                for name, size_gb in volumes
             )
+        )
+
+
+def create_volume(
+    pool: str,
+    name: str,
+    size_gb: int,
+    fmt: str = "qcow2",
+    source_path: str | None = None,
+) -> None:
+    args = ["sudo", "virsh", *_vol_create_as_args(pool, name, size_gb, fmt)]
+    with _storage_lock():
+        subprocess.check_call(args, stdout=subprocess.DEVNULL)
+
+        if source_path is not None:
+            if fmt == "raw":
+                # vol-upload copies raw bytes without format conversion,
+                # so we must use qemu-img convert to handle any source format.
+                vol_path = _get_vol_path(pool, name)
+                src_fmt = _get_image_format(source_path)
+                subprocess.check_call(
+                    [
+                        "sudo",
+                        "qemu-img",
+                        "convert",
+                        "-f",
+                        src_fmt,
+                        "-O",
+                        "raw",
+                        source_path,
+                        vol_path,
+                    ],
+                    stdout=subprocess.DEVNULL,
+                )
+            else:
+                subprocess.check_call(
+                    ["sudo", "virsh", "vol-upload", "--pool", pool, name, source_path],
+                    stdout=subprocess.DEVNULL,
+                )
 
 
 def update_volume(
@@ -704,25 +1047,27 @@ def update_volume(
     size_gb: int | None = None,
     source_path: str | None = None,
 ) -> None:
-    if size_gb is not None:
-        subprocess.check_call(
-            ["sudo", "virsh", "vol-resize", "--pool", pool, name, f"{size_gb}G"],
-            stdout=subprocess.DEVNULL,
-        )
+    with _storage_lock():
+        if size_gb is not None:
+            subprocess.check_call(
+                ["sudo", "virsh", "vol-resize", "--pool", pool, name, f"{size_gb}G"],
+                stdout=subprocess.DEVNULL,
+            )
 
-    if source_path is not None:
-        subprocess.check_call(
-            ["sudo", "virsh", "vol-upload", "--pool", pool, name, source_path],
-            stdout=subprocess.DEVNULL,
-        )
+        if source_path is not None:
+            subprocess.check_call(
+                ["sudo", "virsh", "vol-upload", "--pool", pool, name, source_path],
+                stdout=subprocess.DEVNULL,
+            )
 
 
 def delete_volume(pool: str, name: str) -> None:
     try:
-        subprocess.check_call(
-            ["sudo", "virsh", "vol-delete", "--pool", pool, name],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        with _storage_lock():
+            subprocess.check_call(
+                ["sudo", "virsh", "vol-delete", "--pool", pool, name],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
     except subprocess.CalledProcessError:
         pass
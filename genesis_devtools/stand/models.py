@@ -16,25 +16,55 @@
 from __future__ import annotations
 
 import re
+import functools
 import ipaddress
 import typing as tp
 import dataclasses
 import uuid
 import random
+import socket
 
+_IPV4_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+_STAND_NESTED_FIELDS = frozenset(
+    ("bootstraps", "baremetals", "network", "boot_network", "hypervisors")
+)
 
-@dataclasses.dataclass
+
+@functools.lru_cache(maxsize=64)
+def _cidr_bounds(cidr: ipaddress.IPv4Network) -> tp.Tuple[int, int]:
+    """The first and the last addresses of the network as integers."""
+    return int(cidr.network_address), int(cidr.broadcast_address)
+
+
+@functools.lru_cache(maxsize=256)
+def _uri_in_cidr(uri: str, cidr: ipaddress.IPv4Network) -> bool:
+    """Check the IPv4 address of the URI, if any, belongs to the network."""
+    # No dots, no IPv4 address. Skip the regex for URIs like qemu:///system
+    match = _IPV4_RE.search(uri) if "." in uri else None
+    if not match:
+        # Perhaps it's a domain name
+        return True
+
+    # inet_pton is much cheaper than ipaddress and, unlike inet_aton,
+    # rejects octets with leading zeros the same way ipaddress does.
+    try:
+        packed = socket.inet_pton(socket.AF_INET, match.group(0))
+    except OSError:
+        return False
+
+    lo, hi = _cidr_bounds(cidr)
+    return lo <= int.from_bytes(packed, "big") <= hi
+
+
+@dataclasses.dataclass(slots=True)
 class Port:
     mac: str
     ip: ipaddress.IPv4Address | None = None
 
     @classmethod
     def from_spec(cls, spec: dict[str, tp.Any]) -> Port:
-        spec = spec.copy()
-        spec["ip"] = (
-            ipaddress.IPv4Address(spec["ip"]) if spec["ip"] is not None else None
-        )
-        return cls(**spec)
+        ip = ipaddress.IPv4Address(spec["ip"]) if spec["ip"] is not None else None
+        return cls(**{**spec, "ip": ip})
 
     @classmethod
     def gen_mac(cls) -> str:
@@ -50,7 +80,7 @@ class Port:
         return cls(mac=cls.gen_mac(), ip=None)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Network:
     name: str
     cidr: ipaddress.IPv4Network
@@ -60,7 +90,9 @@ class Network:
     managed_network: bool = True
 
     @classmethod
+    @functools.cache
     def dummy(cls) -> Network:
+        # Networks are frozen, so all the empty stands share one placeholder
         return cls(
             name="dummy",
             cidr=ipaddress.IPv4Network("0.0.0.0/24"),
@@ -73,12 +105,10 @@ class Network:
 
     @classmethod
     def from_spec(cls, spec: dict[str, tp.Any]) -> Network:
-        spec = spec.copy()
-        spec["cidr"] = ipaddress.IPv4Network(spec["cidr"])
-        return cls(**spec)
+        return cls(**{**spec, "cidr": ipaddress.IPv4Network(spec["cidr"])})
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Disk:
     size: int
     label: str = ""
@@ -91,42 +121,63 @@ class Disk:
         return cls(**spec)
 
 
-@dataclasses.dataclass
+# Disks are immutable, so the default ones are shared between nodes
+_DEFAULT_NODE_DISKS = (Disk(size=10),)
+_DEFAULT_BOOTSTRAP_DISKS = (
+    Disk(size=10, label="root-volume"),
+    Disk(size=10, label="data"),
+)
+
+
+@dataclasses.dataclass(slots=True)
 class Node:
     uuid: uuid.UUID = dataclasses.field(default_factory=uuid.uuid4)
     name: str = "genesis-node"
     memory: int = 1024
     cores: int = 1
-    disks: list[Disk] = dataclasses.field(default_factory=lambda: [Disk(size=10)])
+    disks: list[Disk] = dataclasses.field(
+        default_factory=functools.partial(list, _DEFAULT_NODE_DISKS)
+    )
     image: str | None = None
     image_uri: str | None = None
     ports: list[Port] = dataclasses.field(default_factory=list)
 
     @classmethod
     def from_spec(cls, spec: dict[str, tp.Any]) -> Node:
-        spec = spec.copy()
-        spec["disks"] = [Disk.from_spec(d) for d in spec.pop("disks", [])]
-        spec["ports"] = [Port.from_spec(p) for p in spec.pop("ports", [])]
-        return cls(**spec)
+        return cls(
+            **{
+                **spec,
+                "disks": [Disk.from_spec(d) for d in spec.get("disks", [])],
+                "ports": [Port.from_spec(p) for p in spec.get("ports", [])],
+            }
+        )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Bootstrap(Node):
     name: str = "genesis-bootstrap"
     # Two disks for the bootstrap, one for the root and one for the data
     disks: list[Disk] = dataclasses.field(
-        default_factory=lambda: [
-            Disk(size=10, label="root-volume"),
-            Disk(size=10, label="data"),
-        ]
+        default_factory=functools.partial(list, _DEFAULT_BOOTSTRAP_DISKS)
     )
 
     @classmethod
     def from_node(cls, node: Node) -> Bootstrap:
-        return cls(**dataclasses.asdict(node))
+        # Copy the fields as is, `asdict` would turn disks and ports
+        # into dictionaries.
+        return cls(
+            uuid=node.uuid,
+            name=node.name,
+            memory=node.memory,
+            cores=node.cores,
+            disks=list(node.disks),
+            image=node.image,
+            image_uri=node.image_uri,
+            ports=list(node.ports),
+        )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Hypervisor:
     network_type: str
     network: str
@@ -141,21 +192,10 @@ class Hypervisor:
         return cls(**spec)
 
     def is_valid(self, network: Network) -> bool:
-        match = re.search(r"\b(?:\d{1,3}\.){3}\d{1,3}\b", self.connection_uri)
-        if not match:
-            # Perhaps it's a domain name
-            return True
-
-        ip_str = match.group(0)
-        try:
-            ip = ipaddress.ip_address(ip_str)
-        except ValueError:
-            return False
+        return _uri_in_cidr(self.connection_uri, network.cidr)
 
-        return network.cidr.overlaps(ipaddress.ip_network(ip))
 
-
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Stand:
     # Main network of the installation. After bootstrap
     # procedure a node will be connected to this network.
@@ -172,14 +212,10 @@ class Stand:
         if self.network.is_dummy or not self.bootstraps:
             return False
 
-        if all(b.image is None for b in self.bootstraps):
+        if not any(b.image is not None for b in self.bootstraps):
             return False
 
-        for h in self.hypervisors:
-            if not h.is_valid(self.network):
-                return False
-
-        return True
+        return all(h.is_valid(self.network) for h in self.hypervisors)
 
     def has_bootstrap_image(self) -> bool:
         return any(b.image for b in self.bootstraps)
@@ -221,7 +257,9 @@ class Stand:
                 )
             ],
             baremetals=[],
-            hypervisors=list(hypervisors),
+            hypervisors=(
+                hypervisors if isinstance(hypervisors, list) else list(hypervisors)
+            ),
         )
 
     @classmethod
@@ -248,25 +286,25 @@ class Stand:
 
     @classmethod
     def from_spec(cls, spec: dict[str, tp.Any]) -> Stand:
-        spec = spec.copy()
-        bootstraps = [Bootstrap.from_spec(b) for b in spec.pop("bootstraps", [])]
-        baremetals = [Node.from_spec(n) for n in spec.pop("baremetals", [])]
+        bootstraps = [Bootstrap.from_spec(b) for b in spec.get("bootstraps", [])]
+        baremetals = [Node.from_spec(n) for n in spec.get("baremetals", [])]
 
         if "network" not in spec:
             network = Network.dummy()
         else:
-            network = Network.from_spec(spec.pop("network"))
+            network = Network.from_spec(spec["network"])
 
         if "boot_network" not in spec:
             boot_network = Network.dummy()
         else:
-            boot_network = Network.from_spec(spec.pop("boot_network"))
+            boot_network = Network.from_spec(spec["boot_network"])
 
         return cls(
             bootstraps=bootstraps,
             baremetals=baremetals,
             network=network,
             boot_network=boot_network,
-            hypervisors=[Hypervisor.from_spec(h) for h in spec.pop("hypervisors", [])],
-            **spec,
+            hypervisors=[Hypervisor.from_spec(h) for h in spec.get("hypervisors", [])],
+            # The rest of the fields are passed as is
+            **{k: v for k, v in spec.items() if k not in _STAND_NESTED_FIELDS},
         )
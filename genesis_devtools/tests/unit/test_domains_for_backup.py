@@ -56,3 +56,11 @@ def test_domains_for_backup_exclude_patterns():
             raise_on_domain_absence=True,
         )
         assert set(result) == set()
+
+        # Case 5: character classes and single character wildcards
+        result = _domains_for_backup(
+            names=None,
+            exclude_names=("vm[2-9]", "stand-0?"),
+            raise_on_domain_absence=True,
+        )
+        assert set(result) == {"vm1"}
@@ -0,0 +1,116 @@
+#    Copyright 2026 Genesis Corporation.
+#
+#    All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from genesis_devtools.clients import iam
+
+
+@pytest.fixture
+def token() -> iam.Token:
+    return iam.Token(
+        url="http://iam.local/v1/iam/clients/default",
+        project_id="project",
+        token="access",
+        refresh_token="refresh",
+    )
+
+
+class TestToken:
+    def test_save_load(self, tmp_path, token: iam.Token) -> None:
+        token.save(str(tmp_path))
+
+        assert iam.Token.exists(str(tmp_path))
+        assert iam.Token.load(str(tmp_path)) == token
+
+    def test_save_file_mode(self, tmp_path, token: iam.Token) -> None:
+        token.save(str(tmp_path))
+
+        auth_file = iam.Token.file_path(str(tmp_path))
+        assert os.stat(auth_file).st_mode & 0o777 == 0o600
+        assert os.listdir(os.path.dirname(auth_file)) == ["auth.json"]
+
+    def test_save_existing_without_force(self, tmp_path, token: iam.Token) -> None:
+        token.save(str(tmp_path))
+
+        with pytest.raises(iam.TokenFileAlreadyExistsError):
+            token.save(str(tmp_path))
+
+    def test_save_failed_keeps_original(self, tmp_path, token: iam.Token) -> None:
+        token.save(str(tmp_path))
+        auth_file = iam.Token.file_path(str(tmp_path))
+
+        with (
+            patch.object(iam.os, "replace", side_effect=OSError("EIO")),
+            pytest.raises(OSError),
+        ):
+            token.save(str(tmp_path), force=True)
+
+        # The temporary file is removed, the original one is intact
+        assert os.listdir(os.path.dirname(auth_file)) == ["auth.json"]
+        assert iam.Token.load(str(tmp_path)) == token
+
+    def test_load_missing(self, tmp_path) -> None:
+        with pytest.raises(iam.TokenFileNotFoundError):
+            iam.Token.load(str(tmp_path))
+
+
+class TestIAMClient:
+    def test_non_json_response(self) -> None:
+        client = iam.IAMClient("http://iam.local", "project")
+        response = MagicMock(ok=True, content=b"<html/>")
+
+        with patch.object(client._session, "request", return_value=response):
+            with pytest.raises(iam.IAMClientError):
+                client.me(MagicMock(token="access"))
+
+    def test_refresh_payload(self, token: iam.Token) -> None:
+        client = iam.IAMClient(
+            "http://iam.local", "project", client_id="cid", client_secret="secret"
+        )
+        response = MagicMock(
+            ok=True, content=b'{"access_token": "a2", "refresh_token": "r2"}'
+        )
+
+        with patch.object(client._session, "request", return_value=response) as request:
+            new_token = client.refresh(token, ttl=60)
+
+        assert request.call_args.kwargs["data"] == {
+            "grant_type": "refresh_token",
+            "refresh_token": "refresh",
+            "ttl": "60",
+            "refresh_ttl": str(client._refresh_ttl),
+            "scope": token.scope,
+            "client_id": "cid",
+            "client_secret": "secret",
+        }
+        assert new_token.token == "a2"
+        assert new_token.ttl == 60
+
+    def test_me_many(self) -> None:
+        client = iam.IAMClient("http://iam.local", "project")
+        tokens = [MagicMock(token=f"access{i}") for i in range(3)]
+
+        def _request(method, url, timeout, headers):
+            body = '{"token": "%s"}' % headers["Authorization"].split()[-1]
+            return MagicMock(ok=True, content=body.encode())
+
+        with patch.object(client._session, "request", side_effect=_request):
+            result = client.me_many(tokens)
+
+        assert result == [{"token": f"access{i}"} for i in range(3)]
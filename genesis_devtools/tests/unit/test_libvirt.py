@@ -0,0 +1,509 @@
+#    Copyright 2025 Genesis Corporation.
+#
+#    All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import ipaddress
+import os
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from genesis_devtools.exceptions import RunException
+from genesis_devtools.infra.libvirt import libvirt
+from genesis_devtools.stand import models
+
+DOMAIN_XML = """
+<domain type='kvm' id='3'>
+  <name>vm1</name>
+  <devices>
+    <disk type='file' device='disk'>
+      <driver name='qemu' type='qcow2'/>
+      <source file='/var/lib/libvirt/images/vm1.backup_snap'/>
+      <backingStore type='file'>
+        <format type='qcow2'/>
+        <source file='/var/lib/libvirt/images/vm1.qcow2'/>
+      </backingStore>
+      <target dev='vda' bus='virtio'/>
+    </disk>
+    <disk type='file' device='disk'>
+      <driver name='qemu' type='qcow2'/>
+      <source file="/var/lib/libvirt/images/vm1-data.qcow2"/>
+      <target dev='vdb' bus='virtio'/>
+    </disk>
+    <disk type='file' device='cdrom'>
+      <driver name='qemu' type='raw'/>
+      <source file='/var/lib/genesis/config-drives/vm1-config-drive.iso'/>
+      <target dev='sda' bus='sata'/>
+      <readonly/>
+    </disk>
+    <interface type='network'>
+      <mac address='52:54:00:aa:bb:01'/>
+      <source network='genesis-net'/>
+      <model type='virtio'/>
+    </interface>
+    <interface type='bridge'>
+      <mac address='52:54:00:aa:bb:02'/>
+      <source bridge='br0'/>
+      <model type='virtio'/>
+    </interface>
+  </devices>
+</domain>
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_list_cache():
+    libvirt._list_cache.clear()
+    yield
+    libvirt._list_cache.clear()
+
+
+class TestLibvirt:
+    def test_domain_xml_and_disks(self) -> None:
+        with patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML) as dump:
+            xml_str, disks = libvirt.domain_xml_and_disks("vm1")
+
+        dump.assert_called_once_with("vm1")
+        assert xml_str == DOMAIN_XML
+        assert disks == [
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1-data.qcow2",
+            "/var/lib/genesis/config-drives/vm1-config-drive.iso",
+        ]
+
+    def test_snapshot_disks_from_xml(self) -> None:
+        xml_str = DOMAIN_XML.replace("'vdb'", "'vdc'")
+
+        # The config drive CD-ROM is read-only and is never snapshotted
+        assert libvirt.snapshot_disks_from_xml(xml_str) == [
+            ("vda", "/var/lib/libvirt/images/vm1.backup_snap"),
+            ("vdc", "/var/lib/libvirt/images/vm1-data.qcow2"),
+        ]
+
+    def test_is_active_domain_xml(self) -> None:
+        assert libvirt.is_active_domain_xml(DOMAIN_XML)
+        assert not libvirt.is_active_domain_xml(DOMAIN_XML.replace(" id='3'", "", 1))
+
+    def test_list_domains_meta_tag_single_dump(self) -> None:
+        vm2_xml = DOMAIN_XML.replace("vm1", "vm2")
+        vm3_xml = DOMAIN_XML.replace("vm1", "vm3").replace(
+            "<devices>", "<metadata>genesis-stand</metadata>\n  <devices>"
+        )
+        dump = MagicMock(returncode=0, stdout=f"{vm2_xml}\n{vm3_xml}\n", stderr="")
+
+        with (
+            patch.object(
+                libvirt.subprocess, "check_output", return_value="vm2\nvm3\n\n"
+            ),
+            patch.object(libvirt.subprocess, "run", return_value=dump) as run,
+        ):
+            assert libvirt.list_domains(meta_tag="genesis-stand") == ["vm3"]
+            assert libvirt.list_xml_domains() == [vm2_xml.strip(), vm3_xml.strip()]
+
+        assert run.call_args.args[0] == [
+            "sudo",
+            "virsh",
+            "dumpxml vm2; dumpxml vm3",
+        ]
+        assert run.call_args.kwargs["env"]["LC_ALL"] == "C"
+
+    def test_virsh_batch_error(self) -> None:
+        result = MagicMock(
+            returncode=0, stdout="", stderr="error: failed to start network"
+        )
+
+        with patch.object(libvirt.subprocess, "run", return_value=result):
+            with pytest.raises(RunException):
+                libvirt._virsh_batch(["net-start", "net"], ["net-autostart", "net"])
+
+    def test_get_domain_ip(self) -> None:
+        addresses = MagicMock(
+            returncode=0,
+            stdout=(
+                " Name       MAC address          Protocol     Address\n"
+                "-------------------------------------------------------\n"
+                " vnet0      52:54:00:aa:bb:01    ipv6         fd00::5/64\n"
+                " -          -                    ipv4         10.20.0.5/24\n"
+                "\n"
+            ),
+        )
+
+        with patch.object(libvirt.subprocess, "run", return_value=addresses) as run:
+            assert libvirt.get_domain_ip("vm1") == "10.20.0.5"
+
+        assert run.call_args.args[0] == [
+            "sudo",
+            "virsh",
+            "domifaddr",
+            "vm1",
+            "--source",
+            "lease",
+        ]
+
+    def test_get_domain_ip_not_running(self) -> None:
+        result = MagicMock(returncode=1, stdout="")
+
+        with patch.object(libvirt.subprocess, "run", return_value=result):
+            assert libvirt.get_domain_ip("vm1") is None
+
+    def test_get_domain_disk(self) -> None:
+        with patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML):
+            assert (
+                libvirt.get_domain_disk("vm1")
+                == "/var/lib/libvirt/images/vm1.backup_snap"
+            )
+
+    def test_destroy_domain(self, tmp_path) -> None:
+        with (
+            patch.object(libvirt, "STORAGE_LOCK_PATH", str(tmp_path / "lock")),
+            patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML) as dump,
+            patch.object(libvirt.subprocess, "run"),
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+        ):
+            libvirt.destroy_domain("vm1")
+
+        # The disks and the state are taken from the same dump
+        dump.assert_called_once_with("vm1")
+        assert [c.args[0] for c in check_call.call_args_list] == [
+            ["sudo", "virsh", "destroy", "vm1"],
+            [
+                "sudo",
+                "rm",
+                "-f",
+                "/var/lib/libvirt/images/vm1.backup_snap",
+                "/var/lib/libvirt/images/vm1-data.qcow2",
+                "/var/lib/genesis/config-drives/vm1-config-drive.iso",
+            ],
+        ]
+
+    def test_destroy_domains(self) -> None:
+        with patch.object(libvirt, "destroy_domain") as destroy:
+            libvirt.destroy_domains(["vm1", "vm2", "vm3"])
+
+        assert sorted(c.args[0] for c in destroy.call_args_list) == [
+            "vm1",
+            "vm2",
+            "vm3",
+        ]
+
+    def test_list_cache(self) -> None:
+        with (
+            patch.object(
+                libvirt.subprocess, "check_output", return_value="vm1\nvm2\n"
+            ) as check_output,
+            patch.object(libvirt.subprocess, "run"),
+            patch.object(libvirt.subprocess, "check_call"),
+        ):
+            assert libvirt.has_domain("vm1")
+            assert libvirt.has_domain("vm2")
+            assert check_output.call_count == 1
+
+            libvirt.destroy_net("net")
+            assert not libvirt.has_domain("vm3")
+            assert check_output.call_count == 2
+
+    def test_list_empty(self) -> None:
+        with patch.object(libvirt.subprocess, "check_output", return_value="\n"):
+            assert libvirt.list_nets() == []
+            assert libvirt.list_pool() == []
+
+    def test_create_volumes_single_call(self, tmp_path) -> None:
+        result = MagicMock(returncode=0, stdout="", stderr="")
+
+        with (
+            patch.object(libvirt, "STORAGE_LOCK_PATH", str(tmp_path / "lock")),
+            patch.object(libvirt.subprocess, "run", return_value=result) as run,
+        ):
+            libvirt.create_volumes("default", [("d1.qcow2", 10), ("d2.qcow2", 20)])
+
+        run.assert_called_once()
+        assert run.call_args.args[0] == [
+            "sudo",
+            "virsh",
+            "vol-create-as default d1.qcow2 10G --allocation 0 --format qcow2; "
+            "vol-create-as default d2.qcow2 20G --allocation 0 --format qcow2",
+        ]
+
+    def test_storage_lock_of_other_user(self, tmp_path) -> None:
+        lock_path = tmp_path / "lock"
+        lock_path.touch()
+        os_open = os.open
+
+        def _open(path, flags, *args):
+            # fs.protected_regular denies O_CREAT for a file of another user
+            if flags & os.O_CREAT:
+                raise PermissionError(13, "Permission denied")
+            return os_open(path, flags, *args)
+
+        with (
+            patch.object(libvirt, "STORAGE_LOCK_PATH", str(lock_path)),
+            patch.object(libvirt.os, "open", side_effect=_open) as open_,
+        ):
+            with libvirt._storage_lock():
+                pass
+
+        assert open_.call_args.args == (str(lock_path), os.O_RDONLY)
+
+    def test_backup_active_domain_uses_snapshot(self, tmp_path) -> None:
+        xml_str = DOMAIN_XML.replace(
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1.qcow2",
+        )
+
+        with (
+            patch.object(libvirt, "domain_xml", return_value=xml_str),
+            patch.object(libvirt, "create_snapshot") as create_snapshot,
+            patch.object(libvirt, "merge_disk_snapshot") as merge,
+            patch.object(libvirt, "delete_snapshot") as delete_snapshot,
+            patch.object(libvirt, "_copy_disks") as copy_disks,
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+        ):
+            libvirt.backup_domain("vm1", str(tmp_path))
+
+        assert (tmp_path / "domain.xml").read_text() == xml_str
+        create_snapshot.assert_called_once_with("vm1", "backup_snap")
+        copy_disks.assert_called_once()
+        assert sorted(c.args[1:] for c in merge.call_args_list) == [
+            (
+                "vda",
+                "/var/lib/libvirt/images/vm1.qcow2",
+                "/var/lib/libvirt/images/vm1.backup_snap",
+            ),
+            (
+                "vdb",
+                "/var/lib/libvirt/images/vm1-data.qcow2",
+                "/var/lib/libvirt/images/vm1-data.backup_snap",
+            ),
+        ]
+        delete_snapshot.assert_called_once_with("vm1", "backup_snap")
+        assert check_call.call_args.args[0] == [
+            "sudo",
+            "rm",
+            "-f",
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1-data.backup_snap",
+        ]
+        # No suspend/resume of the domain
+        assert all("suspend" not in c.args[0] for c in check_call.call_args_list)
+
+    def test_backup_active_domain_without_guest_agent(self, tmp_path) -> None:
+        with (
+            patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML),
+            patch.object(
+                libvirt,
+                "create_snapshot",
+                side_effect=RunException(
+                    "error: Guest agent is not responding: "
+                    "QEMU guest agent is not connected"
+                ),
+            ),
+            patch.object(libvirt, "cleanup_snapshot") as cleanup_snapshot,
+            patch.object(libvirt, "merge_disk_snapshot") as merge,
+            patch.object(libvirt, "_copy_disks") as copy_disks,
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+        ):
+            libvirt.backup_domain("vm1", str(tmp_path))
+
+        copy_disks.assert_called_once()
+        merge.assert_not_called()
+        cleanup_snapshot.assert_not_called()
+        assert [c.args[0] for c in check_call.call_args_list] == [
+            ["sudo", "virsh", "suspend", "vm1"],
+            ["sudo", "virsh", "resume", "vm1"],
+        ]
+
+    def test_backup_active_domain_leftover_snapshot(self, tmp_path) -> None:
+        xml_str = DOMAIN_XML.replace(
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1.qcow2",
+        )
+
+        with (
+            patch.object(libvirt, "domain_xml", side_effect=[DOMAIN_XML, xml_str]),
+            patch.object(
+                libvirt,
+                "create_snapshot",
+                side_effect=[RunException("error: snapshot exists"), None],
+            ) as create_snapshot,
+            patch.object(libvirt, "cleanup_snapshot") as cleanup_snapshot,
+            patch.object(libvirt, "merge_disk_snapshots"),
+            patch.object(libvirt, "delete_snapshot"),
+            patch.object(libvirt, "_copy_disks") as copy_disks,
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+        ):
+            libvirt.backup_domain("vm1", str(tmp_path))
+
+        cleanup_snapshot.assert_called_once_with("vm1", "backup_snap")
+        assert create_snapshot.call_count == 2
+        # The disks and the xml are taken after the cleanup
+        assert (tmp_path / "domain.xml").read_text() == xml_str
+        assert "/var/lib/libvirt/images/vm1.qcow2" in copy_disks.call_args.args[0]
+        assert all("suspend" not in c.args[0] for c in check_call.call_args_list)
+
+    def test_backup_active_domain_snapshot_error(self, tmp_path) -> None:
+        with (
+            patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML),
+            patch.object(
+                libvirt,
+                "create_snapshot",
+                side_effect=RunException("error: no space left on device"),
+            ),
+            patch.object(libvirt, "cleanup_snapshot"),
+            patch.object(libvirt, "_copy_disks") as copy_disks,
+            pytest.raises(RunException),
+        ):
+            libvirt.backup_domain("vm1", str(tmp_path))
+
+        copy_disks.assert_not_called()
+
+    def test_cleanup_snapshot(self) -> None:
+        with (
+            patch.object(libvirt, "domain_xml", return_value=DOMAIN_XML),
+            patch.object(
+                libvirt.subprocess, "check_output", return_value="backup_snap\n\n"
+            ),
+            patch.object(libvirt, "merge_disk_snapshot") as merge,
+            patch.object(libvirt, "delete_snapshot") as delete_snapshot,
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+        ):
+            libvirt.cleanup_snapshot("vm1", "backup_snap")
+
+        # Only vda still runs on the overlay
+        merge.assert_called_once_with(
+            "vm1",
+            "vda",
+            "/var/lib/libvirt/images/vm1.qcow2",
+            "/var/lib/libvirt/images/vm1.backup_snap",
+        )
+        delete_snapshot.assert_called_once_with("vm1", "backup_snap")
+        assert check_call.call_args.args[0] == [
+            "sudo",
+            "rm",
+            "-f",
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1-data.backup_snap",
+        ]
+
+    def test_cleanup_snapshot_already_merged(self) -> None:
+        xml_str = DOMAIN_XML.replace(
+            "/var/lib/libvirt/images/vm1.backup_snap",
+            "/var/lib/libvirt/images/vm1.qcow2",
+        )
+
+        with (
+            patch.object(libvirt, "domain_xml", return_value=xml_str),
+            patch.object(libvirt.subprocess, "check_output", return_value="\n"),
+            patch.object(libvirt, "merge_disk_snapshot") as merge,
+            patch.object(libvirt, "delete_snapshot") as delete_snapshot,
+            patch.object(libvirt.subprocess, "check_call"),
+        ):
+            libvirt.cleanup_snapshot("vm1", "backup_snap")
+
+        merge.assert_not_called()
+        delete_snapshot.assert_not_called()
+
+    def test_define_network_from_stdin(self) -> None:
+        result = MagicMock(returncode=0, stdout="", stderr="")
+
+        with patch.object(libvirt.subprocess, "run", return_value=result) as run:
+            libvirt.define_network("net", "<network/>")
+
+        define, start = run.call_args_list
+        assert define.args[0] == ["sudo", "virsh", "net-define /dev/stdin"]
+        assert define.kwargs["input"] == "<network/>"
+        assert start.args[0] == ["sudo", "virsh", "net-start net; net-autostart net"]
+
+    def test_create_nat_network(self) -> None:
+        cidr = ipaddress.IPv4Network("10.20.0.0/22")
+
+        with patch.object(libvirt, "define_network") as define_network:
+            libvirt.create_nat_network("net1", cidr)
+            libvirt.create_nat_network("net2", cidr, dhcp_enabled=False)
+
+        dhcp_xml = define_network.call_args_list[0].args[1]
+        assert '<ip address="10.20.0.1" netmask="255.255.252.0">' in dhcp_xml
+        assert '<range start="10.20.0.10" end="10.20.0.100"/>' in dhcp_xml
+        no_dhcp_xml = define_network.call_args_list[1].args[1]
+        assert "<name>net2</name>" in no_dhcp_xml
+        assert '<ip address="10.20.0.1" netmask="255.255.252.0"/>' in no_dhcp_xml
+
+    def test_define_network_define_failed(self) -> None:
+        result = MagicMock(returncode=1, stdout="", stderr="error: exists")
+
+        with (
+            patch.object(libvirt.subprocess, "run", return_value=result) as run,
+            pytest.raises(RunException),
+        ):
+            libvirt.define_network("net", "<network/>")
+
+        run.assert_called_once()
+
+    def _create_domain(self, batch_results: list) -> tuple[MagicMock, MagicMock]:
+        with (
+            patch.object(
+                libvirt,
+                "get_pool_info",
+                return_value={"path": "/pool", "type": "dir"},
+            ),
+            patch.object(libvirt, "create_volumes"),
+            patch.object(libvirt, "_storage_lock"),
+            patch.object(libvirt, "_virsh_batch", side_effect=batch_results),
+            patch.object(libvirt.subprocess, "check_call") as check_call,
+            patch.object(libvirt.subprocess, "run") as run,
+        ):
+            libvirt.create_domain(
+                uuid.uuid4(),
+                "vm1",
+                "1",
+                1024,
+                networks=(),
+                ports=(),
+                pool="default",
+                disks=(models.Disk(size=10),),
+            )
+        return check_call, run
+
+    def test_create_domain_define_failed(self) -> None:
+        check_call, run = self._create_domain([RunException("exists")])
+
+        # The domain with the same name is left as is
+        run.assert_not_called()
+        assert check_call.call_args.args[0][:3] == ["sudo", "rm", "-f"]
+
+    def test_create_domain_start_failed(self) -> None:
+        check_call, run = self._create_domain([None, RunException("no memory")])
+
+        run.assert_called_once()
+        assert run.call_args.args[0] == [
+            "sudo",
+            "virsh",
+            "undefine",
+            "--nvram",
+            "vm1",
+        ]
+        assert check_call.call_args.args[0][:3] == ["sudo", "rm", "-f"]
+
+    def test_is_active_domain(self) -> None:
+        with patch.object(
+            libvirt.subprocess, "check_output", return_value="3\n\n"
+        ) as check_output:
+            assert libvirt.is_active_domain("vm1")
+
+        check_output.assert_called_once_with(
+            ["sudo", "virsh", "domid", "vm1"], text=True
+        )
+
+        with patch.object(libvirt.subprocess, "check_output", return_value="-\n\n"):
+            assert not libvirt.is_active_domain("vm1")
@@ -0,0 +1,88 @@
+#    Copyright 2025 Genesis Corporation.
+#
+#    All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest.mock import MagicMock, patch
+
+from rich.table import Table
+
+from genesis_devtools.backup import s3
+from genesis_devtools.backup.local import LocalQcowBackuper
+from genesis_devtools.infra.libvirt import libvirt
+from genesis_devtools.logger import AbstractLogger
+
+
+class TestQcowBackuper:
+    def test_backup_domains_collects_all_results(self) -> None:
+        logger = MagicMock(spec=AbstractLogger)
+        backuper = LocalQcowBackuper("/tmp/backups", logger=logger, max_parallel=2)
+
+        def _backup_domain(domain, domain_backup_path, encryption=None):
+            if domain == "vm2":
+                raise RuntimeError("boom")
+            return domain, "ts", "te", "1.00", "1 GB", "success"
+
+        with patch.object(backuper, "_backup_domain", side_effect=_backup_domain):
+            backuper.backup_domains("/tmp/backups/b", ["vm1", "vm2", "vm3"])
+
+        tables = [
+            c.args[0]
+            for c in logger.info.call_args_list
+            if isinstance(c.args[0], Table)
+        ]
+        assert len(tables) == 1
+        assert tables[0].row_count == 2
+        assert list(tables[0].columns[0].cells) == ["vm1", "vm3"]
+        logger.error.assert_called_once_with("Failed to backup domain vm2: boom")
+
+    def test_cleanup_after_failure(self, tmp_path) -> None:
+        logger = MagicMock(spec=AbstractLogger)
+        backuper = LocalQcowBackuper(str(tmp_path), logger=logger)
+        backup_path = tmp_path / "b"
+        backup_path.mkdir()
+
+        def _cleanup_snapshot(domain, snap_name):
+            if domain == "vm2":
+                raise RuntimeError("boom")
+
+        with patch.object(
+            libvirt, "cleanup_snapshot", side_effect=_cleanup_snapshot
+        ) as cleanup_snapshot:
+            backuper._cleanup_after_failure(["vm1", "vm2", "vm3"], str(backup_path))
+
+        assert not backup_path.exists()
+        # A failed domain doesn't stop the cleanup of the others
+        assert [c.args for c in cleanup_snapshot.call_args_list] == [
+            ("vm1", "backup_snap"),
+            ("vm2", "backup_snap"),
+            ("vm3", "backup_snap"),
+        ]
+        logger.error.assert_called_once_with(
+            "Failed to clean up snapshot backup_snap of domain vm2: boom"
+        )
+
+
+class TestS3QcowBackuper:
+    def test_shared_client(self) -> None:
+        with patch.object(s3.boto3, "client") as client:
+            backuper = s3.S3QcowBackuper(
+                "http://s3.local", "access", "secret", "host1", "bucket"
+            )
+            backuper.backup_domain_spec("<domain/>", "host1/b/vm1")
+            backuper.backup_domain_spec("<domain/>", "host1/b/vm2")
+
+        client.assert_called_once()
+        assert client.return_value.upload_fileobj.call_count == 2
+        assert backuper._backup_dir == "host1"
+        assert backuper._max_parallel == 4
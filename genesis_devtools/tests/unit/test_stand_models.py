@@ -0,0 +1,149 @@
+#    Copyright 2025 Genesis Corporation.
+#
+#    All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import copy
+import dataclasses
+import ipaddress
+
+import pytest
+
+from genesis_devtools.stand import models
+
+
+@pytest.fixture
+def network() -> models.Network:
+    return models.Network(name="main", cidr=ipaddress.IPv4Network("10.20.0.0/22"))
+
+
+def _hypervisor(uri: str) -> models.Hypervisor:
+    return models.Hypervisor(network_type="bridge", network="br0", connection_uri=uri)
+
+
+class TestHypervisor:
+    @pytest.mark.parametrize(
+        "uri,valid",
+        [
+            ("qemu+tcp://10.20.0.2/system", True),
+            ("qemu+ssh://user@10.20.3.255/system", True),
+            ("qemu+tcp://10.20.4.1/system", False),
+            ("qemu+tcp://999.20.0.2/system", False),
+            ("qemu+tcp://10.020.0.2/system", False),
+            ("qemu+ssh://user@hypervisor.local/system", True),
+            ("qemu:///system", True),
+        ],
+    )
+    def test_is_valid(self, network: models.Network, uri: str, valid: bool) -> None:
+        assert _hypervisor(uri).is_valid(network) is valid
+
+
+class TestBootstrap:
+    def test_from_node(self) -> None:
+        node = models.Node(
+            name="node",
+            disks=[models.Disk(size=20, label="root")],
+            ports=[models.Port.port_with_random_mac()],
+            image="image.raw",
+        )
+
+        bootstrap = models.Bootstrap.from_node(node)
+
+        assert isinstance(bootstrap, models.Bootstrap)
+        assert bootstrap.uuid == node.uuid
+        assert bootstrap.name == "node"
+        assert bootstrap.disks == node.disks
+        assert bootstrap.disks is not node.disks
+        assert isinstance(bootstrap.disks[0], models.Disk)
+        assert isinstance(bootstrap.ports[0], models.Port)
+        assert bootstrap.image == "image.raw"
+
+
+class TestStand:
+    def test_from_spec(self) -> None:
+        spec = {
+            "name": "stand",
+            "network": {"name": "main", "cidr": "10.20.0.0/22", "dhcp": True},
+            "bootstraps": [
+                {
+                    "name": "bootstrap",
+                    "disks": [{"size": 20, "label": "root"}],
+                    "ports": [{"mac": "52:54:00:00:00:01", "ip": "10.20.0.2"}],
+                }
+            ],
+            "hypervisors": [
+                {
+                    "network_type": "bridge",
+                    "network": "br0",
+                    "connection_uri": "qemu+tcp://10.20.0.3/system",
+                }
+            ],
+        }
+        orig_spec = copy.deepcopy(spec)
+
+        stand = models.Stand.from_spec(spec)
+
+        assert spec == orig_spec
+        assert stand.name == "stand"
+        assert stand.network.cidr == ipaddress.IPv4Network("10.20.0.0/22")
+        assert stand.network.dhcp
+        assert stand.boot_network.is_dummy
+        assert stand.bootstraps[0].disks == [models.Disk(size=20, label="root")]
+        assert stand.bootstraps[0].ports[0].ip == ipaddress.IPv4Address("10.20.0.2")
+        assert stand.baremetals == []
+        assert stand.hypervisors[0].is_valid(stand.network)
+
+    def test_from_spec_unknown_field(self) -> None:
+        with pytest.raises(TypeError):
+            models.Stand.from_spec({"unknown": 1})
+
+    def test_is_valid(self, network: models.Network) -> None:
+        stand = models.Stand.empty_stand(network=network)
+        assert not stand.is_valid()
+
+        stand.bootstraps.append(models.Bootstrap())
+        assert not stand.is_valid()
+
+        stand.set_bootstrap_image("image.raw")
+        assert stand.is_valid()
+
+        stand.hypervisors.append(_hypervisor("qemu+tcp://10.30.0.2/system"))
+        assert not stand.is_valid()
+
+
+class TestNetwork:
+    def test_frozen_hashable(self, network: models.Network) -> None:
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            network.name = "other"
+
+        assert {network: 1}[
+            models.Network(name="main", cidr=ipaddress.IPv4Network("10.20.0.0/22"))
+        ] == 1
+
+    def test_dummy_shared(self) -> None:
+        stand = models.Stand.empty_stand()
+
+        assert stand.network is models.Network.dummy()
+        assert stand.boot_network.is_dummy
+
+
+class TestNode:
+    def test_default_disks(self) -> None:
+        node1, node2 = models.Node(), models.Node()
+        node1.disks.append(models.Disk(size=20))
+
+        assert node2.disks == [models.Disk(size=10)]
+        assert models.Bootstrap().disks == [
+            models.Disk(size=10, label="root-volume"),
+            models.Disk(size=10, label="data"),
+        ]
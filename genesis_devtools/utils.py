@@ -28,7 +28,6 @@ import urllib.parse
 import socket
 from importlib.metadata import entry_points
 
-import git
 import yaml
 import rich_click as click
 from cryptography.hazmat.primitives import ciphers
@@ -38,6 +37,9 @@ from cryptography.hazmat import backends as crypto_back
 
 import genesis_devtools.constants as c
 
+if tp.TYPE_CHECKING:
+    import git
+
 
 def load_from_entry_point(group: str, name: str) -> tp.Any:
     """Load class from entry points."""
@@ -127,6 +129,9 @@ def installation_name_from_bootstrap(bootstrap_name: str) -> str:
 
 
 def get_repo(path: str) -> git.Repo:
+    # GitPython is heavy to import, load it only when it's really needed
+    import git
+
     repo = git.Repo(path)
     return repo
 
@@ -140,6 +145,8 @@ def get_project_version(
     if not os.path.isdir(path):
         raise ValueError(f"Path {path} is not a directory")
 
+    import git
+
     # Open the git repo
     repo = git.Repo(path)
 
@@ -292,6 +299,7 @@ def encrypt_file(
     iv: bytes,
     chunk_size_kb: int = 128,
     extension: str = c.ENCRYPTED_EXTENSION,
+    encrypted_path: str | None = None,
 ) -> None:
     # Ensure that the key and iv are the correct lengths
     # for AES (16 bytes for AES-128)
@@ -305,7 +313,10 @@ def encrypt_file(
         backend=crypto_back.default_backend(),
     )
     chunk_size = chunk_size_kb << 10
-    encrypted_path = path + extension
+
+    # Put the encrypted file next to the original one by default
+    if encrypted_path is None:
+        encrypted_path = path + extension
 
     # Open the input file and the temporary output file
     try: